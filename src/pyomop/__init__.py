@@ -5,11 +5,6 @@ from .engine_factory import CdmEngineFactory
 from .cdm6_tables import metadata
 from .vocabulary import CdmVocabulary
 from .vector import CdmVector
-try:
-    from .llm_query import CdmLLMQuery
-    from .llm_engine import CDMDatabase
-except ImportError:
-    _logger.warn("LLM is not installed. Please install LLM with pip install pyomop[llm] to use this package.")
 
 from .cdm6_tables import AttributeDefinition
 from .cdm6_tables import CareSite
@@ -70,3 +65,17 @@ except PackageNotFoundError:  # pragma: no cover
     __version__ = "unknown"
 finally:
     del version, PackageNotFoundError
+
+
+def __getattr__(name):
+    # The LLM classes pull in llama-index and langchain, which are slow to
+    # import, so they are only loaded when first used.
+    if name in ('CdmLLMQuery', 'CDMDatabase'):
+        try:
+            from .llm_query import CdmLLMQuery
+            from .llm_engine import CDMDatabase
+        except ImportError:
+            _logger.warning("LLM is not installed. Please install LLM with pip install pyomop[llm] to use this package.")
+            raise
+        return CdmLLMQuery if name == 'CdmLLMQuery' else CDMDatabase
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -110,7 +110,7 @@ class Concept(Base):
     vocabulary_id = Column(String(20), nullable=False)
     concept_class_id = Column(String(20), nullable=False)
     standard_concept = Column(String(1))
-    concept_code = Column(String(50), nullable=False)
+    concept_code = Column(String(50), nullable=False, index=True)
     valid_start_date = Column(String(30), nullable=False)
     valid_end_date = Column(String(30), nullable=False)
     invalid_reason = Column(String(1))
@@ -3,11 +3,27 @@
 # from sqlalchemy.ext.automap import automap_base
 
 import asyncio
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.automap import automap_base
 
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL with synchronous=NORMAL syncs on checkpoint instead of every commit.
+    # journal_mode=WAL is stored in the database file and outlives pyomop.
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
+# engines being disposed from a running loop, kept until their task is done
+_disposing = set()
+
 class CdmEngineFactory(object):
 
     def __init__(self, db = 'sqlite',
@@ -22,13 +38,46 @@ class CdmEngineFactory(object):
         self._pw = pw
         self._schema = schema
         self._engine = None
+        self._session = None
         self._base = None
 
     async def init_models(self, metadata):
-        async with self._engine.begin() as conn:
+        async with self.engine.begin() as conn:
             await conn.run_sync(metadata.drop_all)
             await conn.run_sync(metadata.create_all)
 
+    async def prewarm(self, connections=5):
+        # open pooled connections up front so the first queries do not pay
+        # the connect and authentication handshake on a network database;
+        # connections beyond the pool size would be closed again on return
+        pool_size = getattr(self.engine.pool, 'size', None)
+        if pool_size is not None:
+            connections = min(connections, pool_size())
+        conns = await asyncio.gather(*[self.engine.connect() for _ in range(connections)],
+                                     return_exceptions=True)
+        # return the ones that opened even if another failed, then report it
+        errors = [conn for conn in conns if isinstance(conn, BaseException)]
+        for conn in conns:
+            if not isinstance(conn, BaseException):
+                await conn.close()
+        if errors:
+            raise errors[0]
+
+
+    def _reset_engine(self):
+        # settings changed: release the old pool, the engine (and its session
+        # factory) are rebuilt on next use
+        self._session = None
+        if self._engine is not None:
+            engine, self._engine = self._engine, None
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                asyncio.run(engine.dispose())
+            else:
+                task = loop.create_task(engine.dispose())
+                _disposing.add(task)
+                task.add_done_callback(_disposing.discard)
 
     @property
     def db(self):
@@ -58,10 +107,6 @@ class CdmEngineFactory(object):
     def schema(self):
         return self._schema
 
-    @property
-    def engine(self):
-        return self.engine
-
     @property
     def base(self):
         if self.engine is not None:  # Not self_engine
@@ -72,65 +117,77 @@ class CdmEngineFactory(object):
 
     @property
     def engine(self):
+        # one engine (and connection pool) per factory, shared by all users
+        if self._engine is not None:
+            return self._engine
         if self._db == 'sqlite':
             self._engine = create_async_engine("sqlite+aiosqlite:///"+self._name)
+            # once per pooled connection, not per query
+            event.listen(self._engine.sync_engine, "connect", _sqlite_pragmas)
         if self._db == 'mysql':
-            mysql_url = 'mysql://{}:{}@{}:{}/{}'
+            mysql_url = 'mysql+aiomysql://{}:{}@{}:{}/{}'
             mysql_url = mysql_url.format(self._user, self._pw, self._host, self._port, self._name)
             self._engine = create_async_engine(mysql_url, isolation_level="READ UNCOMMITTED")
         if self._db == 'pgsql':
             # https://stackoverflow.com/questions/9298296/sqlalchemy-support-of-postgres-schemas
             dbschema = '{},public'  # Searches left-to-right
             dbschema = dbschema.format(self._schema)
-            pgsql_url = 'postgresql+psycopg2://{}:{}@{}:{}/{}'
+            # asyncpg: async driver with pipelined executemany for bulk inserts
+            pgsql_url = 'postgresql+asyncpg://{}:{}@{}:{}/{}'
             pgsql_url = pgsql_url.format(self._user, self._pw,
                                         self._host, self._port, self._name)
             self._engine = create_async_engine(
                 pgsql_url,
-                connect_args={'options': '-csearch_path={}'.format(dbschema)})
+                connect_args={'server_settings': {'search_path': dbschema}})
         return self._engine
 
     @property
     def session(self):
-        if self._engine is not None:
-            async_session = sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
-            return async_session
+        if self.engine is not None:
+            # built once, like the engine it is bound to
+            if self._session is None:
+                self._session = sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
+            return self._session
         return None
 
     @property
     def async_session(self):
-        if self._engine is not None:
-            async_session = sessionmaker(self._engine, expire_on_commit=False, class_=AsyncSession)
-            return async_session
-        return None
+        return self.session
 
     @db.setter
     def db(self, value):
         self._db = value
+        self._reset_engine()
 
     @name.setter
     def name(self, value):
         self._name = value
+        self._reset_engine()
 
     @port.setter
     def port(self, value):
         self._port = value
+        self._reset_engine()
 
     @host.setter
     def host(self, value):
         self._host = value
+        self._reset_engine()
 
     @user.setter
     def user(self, value):
         self._user = value
+        self._reset_engine()
 
     @pw.setter
     def pw(self, value):
         self._pw = value
+        self._reset_engine()
 
     @schema.setter
     def schema(self, value):
         self._schema = value
+        self._reset_engine()
 
 
 
@@ -75,6 +75,8 @@ class CDMDatabase(SQLDatabase):
             }
 
         self._max_string_length = max_string_length
+        # the CDM schema is static, so table info is built once per table
+        self._table_info_cache = {}
 
         self._metadata = metadata or MetaData()
 
@@ -96,6 +98,8 @@ class CDMDatabase(SQLDatabase):
     @override
     def get_single_table_info(self, table_name: str) -> str:
         """Get table info for a single table."""
+        if table_name in self._table_info_cache:
+            return self._table_info_cache[table_name]
         # same logic as table_info, but with specific table names
         template = (
             "Table '{table_name}' has columns: {columns}, "
@@ -130,7 +134,9 @@ class CDMDatabase(SQLDatabase):
         #         f"{foreign_key['referred_table']}.{foreign_key['referred_columns']}"
         #     )
         # foreign_key_str = ", ".join(foreign_keys)
-        return template.format(
+        table_info = template.format(
             table_name=table_name, columns=column_str, foreign_keys=foreign_key_str
         )
+        self._table_info_cache[table_name] = table_info
+        return table_info
 
@@ -15,6 +15,26 @@ from llama_index.objects.base import ObjectRetriever
 from langchain.embeddings import HuggingFaceEmbeddings
 from .llm_engine import CDMDatabase
 
+# one SQLTableSchema per CDM table, built once at import
+CDM_TABLE_SCHEMAS = (
+    SQLTableSchema(table_name='care_site'),
+    SQLTableSchema(table_name='condition_occurrence'),
+    SQLTableSchema(table_name='cohort'),
+    SQLTableSchema(table_name='concept'),
+    SQLTableSchema(table_name='death'),
+    SQLTableSchema(table_name='device_exposure'),
+    SQLTableSchema(table_name='drug_exposure'),
+    SQLTableSchema(table_name='location'),
+    SQLTableSchema(table_name='measurement'),
+    SQLTableSchema(table_name='observation'),
+    SQLTableSchema(table_name='observation_period'),
+    SQLTableSchema(table_name='person'),
+    SQLTableSchema(table_name='procedure_occurrence'),
+    SQLTableSchema(table_name='provider'),
+    SQLTableSchema(table_name='visit_occurrence'),
+    SQLTableSchema(table_name='note'),
+)
+
 class CdmLLMQuery(SQLTableRetrieverQueryEngine):
     def __init__(
         self,
@@ -47,24 +67,7 @@ class CdmLLMQuery(SQLTableRetrieverQueryEngine):
         self._service_context = service_context
 
         self._table_node_mapping = SQLTableNodeMapping(sql_database)
-        self._table_schema_objs = [
-            (SQLTableSchema(table_name='care_site')),
-            (SQLTableSchema(table_name='condition_occurrence')),
-            (SQLTableSchema(table_name='cohort')),
-            (SQLTableSchema(table_name='concept')),
-            (SQLTableSchema(table_name='death')),
-            (SQLTableSchema(table_name='device_exposure')),
-            (SQLTableSchema(table_name='drug_exposure')),
-            (SQLTableSchema(table_name='location')),
-            (SQLTableSchema(table_name='measurement')),
-            (SQLTableSchema(table_name='observation')),
-            (SQLTableSchema(table_name='observation_period')),
-            (SQLTableSchema(table_name='person')),
-            (SQLTableSchema(table_name='procedure_occurrence')),
-            (SQLTableSchema(table_name='provider')),
-            (SQLTableSchema(table_name='visit_occurrence')),
-            (SQLTableSchema(table_name='note'))
-        ]  # add a SQLTableSchema for each table
+        self._table_schema_objs = list(CDM_TABLE_SCHEMAS)
 
         self._object_index = ObjectIndex.from_objects(
             self._table_schema_objs,
@@ -1,3 +1,4 @@
+import os
 import click
 import asyncio
 from . import CdmEngineFactory
@@ -24,22 +25,42 @@ from . import __version__
 @click.option('--schema', '-s', multiple=False, default='public',
               help='Database schema (for pgsql)')
 @click.option('--vocab', '-i', multiple=False, default='',
-              help='Folder with vocabulary files (csv) to import')
-def cli(verbose, create, dbtype, host, port, user, pw, name, schema, vocab):
+              help='Folder (or Athena zip file) with vocabulary files (csv) to import')
+@click.option('--workers', multiple=False, default=min(8, os.cpu_count() or 1),
+              type=click.IntRange(min=1),
+              help='Vocabulary tables loaded at the same time (not for sqlite)')
+def cli(verbose, create, dbtype, host, port, user, pw, name, schema, vocab, workers):
     if verbose:
         print("verbose")
-    if create:
+    if create or vocab != '':
         cdm = CdmEngineFactory(dbtype, host, port, user, pw, name, schema)
-        # initialize default engine
-        engine = cdm.engine
-        asyncio.run(cdm.init_models(metadata))
-    if vocab != '':
-        cdm = CdmEngineFactory(dbtype, host, port, user, pw, name, schema)
-        _vocab = CdmVocabulary(cdm)
-        _vocab.create_vocab(vocab)
-        print("Done")
+        asyncio.run(run_steps(cdm, create, vocab, workers))
+
+
+async def run_steps(cdm, create, vocab, workers=None):
+    # all steps share one event loop instead of one asyncio.run each
+    try:
+        if create:
+            await cdm.init_models(metadata)
+        if vocab != '':
+            if cdm.db != 'sqlite':
+                await cdm.prewarm(workers or 5)
+            _vocab = CdmVocabulary(cdm)
+            try:
+                await _vocab.load_vocab(vocab, workers=workers)
+            except Exception as e:
+                print(f"An error occurred while creating the vocabulary: {e}")
+            print("Done")
+    finally:
+        await cdm.engine.dispose()
 
 def main_routine():
+    try:
+        # faster event loop for the async database calls, when installed
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     click.echo("_________________________________________")
     click.echo("Pyomop v" + __version__ + " working:.....")
     cli()  # run the main function
@@ -1,4 +1,5 @@
 import asyncio
+from operator import attrgetter
 import pandas as pd
 from sqlalchemy.inspection import inspect
 from sqlalchemy import text
@@ -30,16 +31,19 @@ class CdmVector(object):
         Return: columns name, list of result
         """
         result_list = []
-        instance = None
+        names = None
         if self._result is None:
             return None, []
         for obj in self._result:
-            instance = inspect(obj)
-            items = instance.attrs.items()
-            result_list.append([x.value for _,x in items])
-        if instance is None:
+            if names is None:
+                # all rows share a mapper, so resolve the attribute names once
+                names = inspect(obj).attrs.keys()
+                getter = attrgetter(*names)
+            values = getter(obj)
+            result_list.append(list(values) if len(names) > 1 else [values])
+        if names is None:
             return None, []
-        return instance.attrs.keys(), result_list
+        return names, result_list
 
     def create_df(self, _names=None):
         names, data = self.query_to_list()
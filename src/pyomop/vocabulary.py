@@ -1,7 +1,12 @@
+import numpy as np
 import pandas as pd
-from .cdm6_tables import Concept
+from .cdm6_tables import Concept, metadata
 import asyncio
-from contextlib import asynccontextmanager
+import io
+import itertools
+import zipfile
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
 from typing import AsyncGenerator
 from sqlalchemy.ext.asyncio import (
     AsyncSession,
@@ -9,9 +14,139 @@ from sqlalchemy.ext.asyncio import (
 )
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import insert
-import numpy as np
 from sqlalchemy.ext.automap import automap_base, AutomapBase
-from sqlalchemy import select
+from sqlalchemy import select, case, any_, bindparam, ARRAY
+from sqlalchemy import BigInteger, Integer, Numeric, String, Text
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = None
+
+
+def _csv_dtypes(table, numeric_text=False):
+    """Column dtypes for reading a vocabulary csv into table.
+
+    Codes and dates are kept as text (so leading zeros survive), integer
+    ids use the nullable Int64 dtype and numeric amounts are parsed as
+    float64, which skips pandas' type inference and float upcasting of
+    columns with blanks. With numeric_text, numeric amounts stay text too,
+    for drivers that turn the value into an exact Decimal (asyncpg), where
+    a float would store its binary expansion instead of the csv literal.
+    """
+    dtypes = {}
+    if table not in metadata.tables:
+        return dtypes
+    for column in metadata.tables[table].columns:
+        if isinstance(column.type, (Integer, BigInteger)):
+            dtypes[column.name] = 'Int64'
+        elif isinstance(column.type, Numeric):
+            dtypes[column.name] = str if numeric_text else 'float64'
+        elif isinstance(column.type, (String, Text)):
+            dtypes[column.name] = str
+    return dtypes
+
+
+def _read_arrow(path, dtypes, chunk_size=None):
+    """Stream a tab separated file through pyarrow's multi-threaded reader."""
+    arrow_types = {'Int64': pa.int64(), 'float64': pa.float64()}
+    column_types = {}
+    for name, dtype in dtypes.items():
+        column_types[name] = arrow_types.get(dtype, pa.string())
+    short_rows = deque()
+
+    def invalid_row(row):
+        # pyarrow rejects rows with missing trailing fields, which pandas
+        # reads with NaN, so these are kept aside and parsed by pandas.
+        if row.actual_columns < row.expected_columns:
+            short_rows.append((row.number, row.text))
+        return 'skip'
+
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=8 << 20, use_threads=True),
+        parse_options=pacsv.ParseOptions(delimiter='\t', invalid_row_handler=invalid_row),
+        convert_options=pacsv.ConvertOptions(column_types=column_types,
+                                             strings_can_be_null=True))
+    frames = _arrow_frames(reader, short_rows, dtypes)
+    if chunk_size is None:
+        frames = list(frames) or [pd.DataFrame(columns=reader.schema.names)]
+        return pd.concat(frames, ignore_index=True)
+    return frames
+
+
+def _arrow_frames(reader, short_rows, dtypes):
+    types_mapper = {pa.int64(): pd.Int64Dtype()}.get
+    line = 2  # file line of the next row, after the header
+    for batch in reader:
+        frame = batch.to_pandas(types_mapper=types_mapper)
+        # The reader parses ahead, so the short rows belonging to this batch
+        # are those whose line comes before its last row. They are parsed
+        # together and put back in their place, keeping the file order (and
+        # with it the autoincrement ids) the same as with pandas.
+        rows = []
+        while short_rows and (short_rows[0][0] is None
+                              or short_rows[0][0] < line + frame.shape[0] + len(rows)):
+            rows.append(short_rows.popleft())
+        if rows:
+            parsed = _parse_rows([text for _, text in rows], reader.schema.names, dtypes)
+            numbers = [number for number, _ in rows]
+            frame = pd.concat([frame, parsed], ignore_index=True)
+            if None not in numbers:
+                span = np.arange(line, line + frame.shape[0])
+                lines = np.concatenate([span[~np.isin(span, numbers)], numbers])
+                frame = frame.iloc[lines.argsort(kind='stable')].reset_index(drop=True)
+        line += frame.shape[0]
+        yield frame
+    if short_rows:
+        yield _parse_rows([text for _, text in short_rows], reader.schema.names, dtypes)
+
+
+def _parse_rows(rows, names, dtypes):
+    return pd.read_csv(io.StringIO('\n'.join(rows)), sep='\t', header=None,
+                       names=names, dtype=dtypes)
+
+
+def _batches(frames, target, chunk_size):
+    """Slices of at most chunk_size rows, with target's columns and None for NA."""
+    columns = None
+    for frame in frames:
+        if columns is None:
+            # same keys, in table order, for every batch of this table
+            columns = [c for c in target.columns.keys() if c in frame.columns]
+        frame = frame[columns]
+        # convert one slice at a time so only chunk_size records exist at once
+        for start in range(0, frame.shape[0], chunk_size):
+            batch = frame.iloc[start:start + chunk_size]
+            yield batch.astype(object).where(batch.notna(), None)
+
+
+def _code_conditions(codes, db):
+    """WHERE clauses matching concept_code against codes, one per query."""
+    if not codes:
+        return []
+    if db == 'pgsql':
+        # a single array parameter, so asyncpg prepares one plan for any
+        # number of codes instead of one per IN list length
+        return [Concept.concept_code == any_(bindparam('codes', codes, type_=ARRAY(String)))]
+    return [Concept.concept_code.in_(codes[start:start + 1000])
+            for start in range(0, len(codes), 1000)]
+
+
+# vocabulary csv files as downloaded from Athena and the tables they load
+VOCAB_FILES = (
+    ('DRUG_STRENGTH.csv', 'drug_strength'),
+    ('CONCEPT.csv', 'concept'),
+    ('CONCEPT_RELATIONSHIP.csv', 'concept_relationship'),
+    ('CONCEPT_ANCESTOR.csv', 'concept_ancestor'),
+    ('CONCEPT_SYNONYM.csv', 'concept_synonym'),
+    ('VOCABULARY.csv', 'vocabulary'),
+    ('RELATIONSHIP.csv', 'relationship'),
+    ('CONCEPT_CLASS.csv', 'concept_class'),
+    ('DOMAIN.csv', 'domain'),
+)
+
+
 class CdmVocabulary(object):
     def __init__(self, cdm):
         self._concept_id = 0
@@ -24,6 +159,9 @@ class CdmVocabulary(object):
         self._engine = cdm.engine
         self._maker = sessionmaker(self._engine, class_=AsyncSession)
         self._scope = async_scoped_session(self._maker, scopefunc=asyncio.current_task)
+        # concepts already fetched, keyed by concept_id and (concept_code, vocabulary_id)
+        self._concept_cache = {}
+        self._automap = None
 
     @property
     def concept_id(self):
@@ -56,17 +194,66 @@ class CdmVocabulary(object):
         self._concept_code = _concept.concept_code
 
     async def get_concept(self, concept_id):
+        if concept_id in self._concept_cache:
+            return self._concept_cache[concept_id]
         stmt = select(Concept).where(Concept.concept_id == concept_id)
         async with self._cdm.session() as session:
             _concept = await session.execute(stmt)
-        return _concept.scalar_one()
+        _concept = _concept.scalar_one()
+        self._concept_cache[concept_id] = _concept
+        return _concept
 
-    async def get_concept_by_code(self, concept_code, vocabulary_id):
-        stmt = select(Concept).where(Concept.concept_code == concept_code) \
-            .where(Concept.vocabulary_id == vocabulary_id)
+    async def get_concept_by_code(self, concept_code, vocabulary_id=None):
+        key = (concept_code, vocabulary_id)
+        if key in self._concept_cache:
+            return self._concept_cache[key]
+        stmt = select(Concept).where(Concept.concept_code == concept_code)
+        if vocabulary_id is not None:
+            stmt = stmt.where(Concept.vocabulary_id == vocabulary_id)
+        else:
+            # A code may exist in several vocabularies; let the database pick
+            # the standard concept first, then the lowest concept_id.
+            stmt = stmt.order_by(case((Concept.standard_concept == 'S', 0), else_=1),
+                                 Concept.concept_id).limit(1)
         async with self._cdm.session() as session:
             _concept = await session.execute(stmt)
-        return _concept.scalar_one()
+        _concept = _concept.scalar_one()
+        self._concept_cache[key] = _concept
+        return _concept
+
+    async def get_concepts_by_code(self, concept_codes, vocabulary_id=None):
+        """Look up many concept codes with one query per 1000 codes (or one on postgres).
+
+        Returns a dict of concept_code to Concept (None when not found). As in
+        get_concept_by_code, a code found in several vocabularies resolves to
+        the standard concept, then the lowest concept_id. With vocabulary_id,
+        a code matching several concepts resolves the same way, where
+        get_concept_by_code raises MultipleResultsFound.
+        """
+        concepts = {}
+        missing = []
+        for code in dict.fromkeys(concept_codes):
+            key = (code, vocabulary_id)
+            if key in self._concept_cache:
+                concepts[code] = self._concept_cache[key]
+            else:
+                missing.append(code)
+        async with self._cdm.session() as session:
+            for condition in _code_conditions(missing, self._cdm.db):
+                stmt = select(Concept).where(condition)
+                if vocabulary_id is not None:
+                    stmt = stmt.where(Concept.vocabulary_id == vocabulary_id)
+                stmt = stmt.order_by(case((Concept.standard_concept == 'S', 0), else_=1),
+                                     Concept.concept_id)
+                result = await session.execute(stmt)
+                # rows come best first, so the first one seen per code wins
+                for _concept in result.scalars():
+                    concepts.setdefault(_concept.concept_code, _concept)
+        for code in missing:
+            _concept = concepts.setdefault(code, None)
+            if _concept is not None:
+                self._concept_cache[(code, vocabulary_id)] = _concept
+        return concepts
 
     def set_concept(self, concept_code, vocabulary_id=None):
         self._concept_code = concept_code
@@ -88,53 +275,131 @@ class CdmVocabulary(object):
             self._vocabulary_id = 0
             self._concept_id = 0
 
-    def create_vocab(self, folder, sample=None):
+    def read_vocab(self, path, table, sample=None, chunk_size=None):
+        """Read a tab separated vocabulary file with typed columns.
+
+        With chunk_size set, an iterator of DataFrames is returned so that
+        large files (CONCEPT_RELATIONSHIP etc.) are never fully in memory.
+        pyarrow is used for parsing when installed, unless a sample is asked for.
+        """
+        # postgres COPY stores numeric amounts exactly from their text
+        dtypes = _csv_dtypes(table, numeric_text=self._cdm.db == 'pgsql')
+        if pa is not None and sample is None:
+            return _read_arrow(path, dtypes, chunk_size)
+        return pd.read_csv(path, sep='\t', nrows=sample, on_bad_lines='skip',
+                           dtype=dtypes, chunksize=chunk_size)
+
+    def create_vocab(self, folder, sample=None, chunk_size=1000, workers=None):
         try:
-            df = pd.read_csv(folder + '/DRUG_STRENGTH.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'drug_strength', 'replace'))
-            # df.to_sql('drug_strength', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/CONCEPT.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'concept', 'replace'))
-            # df.to_sql('concept', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/CONCEPT_RELATIONSHIP.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'concept_relationship', 'replace'))
-            # df.to_sql('concept_relationship', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/CONCEPT_ANCESTOR.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'concept_ancestor', 'replace'))
-            # df.to_sql('concept_ancester', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/CONCEPT_SYNONYM.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'concept_synonym', 'replace'))
-            # df.to_sql('concept_synonym', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/VOCABULARY.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'vocabulary', 'replace'))
-            # df.to_sql('vocabulary', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/RELATIONSHIP.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'relationship', 'replace'))
-            # df.to_sql('relationship', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/CONCEPT_CLASS.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'concept_class', 'replace'))
-            # df.to_sql('concept_class', con=self._engine, if_exists = 'replace')
-            df = pd.read_csv(folder + '/DOMAIN.csv', sep='\t', nrows=sample, on_bad_lines='skip')
-            asyncio.run(self.write_vocab(df, 'domain', 'replace'))
-            # df.to_sql('domain', con=self._engine, if_exists = 'replace')
+            asyncio.run(self.load_vocab(folder, sample, chunk_size, workers))
         except Exception as e:
             print(f"An error occurred while creating the vocabulary: {e}")
 
+    async def load_vocab(self, folder, sample=None, chunk_size=1000, workers=None):
+        # folder may also be the zip file downloaded from Athena, whose csv
+        # files are then read straight from the archive without extracting.
+        async with self.get_session() as session:
+            await self._prepare_automap(await session.connection())
+        if zipfile.is_zipfile(folder):
+            with zipfile.ZipFile(folder) as archive:
+                await self._load_vocab_files(folder, sample, chunk_size, workers, archive)
+        else:
+            await self._load_vocab_files(folder, sample, chunk_size, workers)
+
+    async def _load_vocab_files(self, folder, sample, chunk_size, workers, archive=None):
+        # The vocabulary tables do not reference each other, so they can be
+        # loaded concurrently, each task on its own session, with at most
+        # workers tables at a time. SQLite allows a single writer only and is
+        # loaded table by table.
+        if self._cdm.db == 'sqlite':
+            for filename, table in VOCAB_FILES:
+                await self._load_vocab_file(folder, filename, table, sample, chunk_size, archive)
+            return
+        limit = asyncio.Semaphore(workers or len(VOCAB_FILES))
+
+        async def load(filename, table):
+            async with limit:
+                await self._load_vocab_file(folder, filename, table, sample, chunk_size, archive)
+
+        tasks = [asyncio.ensure_future(load(filename, table)) for filename, table in VOCAB_FILES]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # stop the other tables on the first failure rather than leave
+            # them running past the caller's error handling
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    async def _load_vocab_file(self, folder, filename, table, sample, chunk_size, archive=None):
+        if archive is None:
+            source = nullcontext(folder + '/' + filename)
+        else:
+            source = archive.open(filename)
+        with source as path:
+            df = self.read_vocab(path, table, sample, chunk_size)
+            await self.write_vocab(df, table, 'replace', chunk_size)
+
 
     @asynccontextmanager
     async def get_session(self) -> AsyncGenerator[AsyncSession, None]:
         async with self._scope() as session:
             yield session
 
+    async def _prepare_automap(self, conn, table=None):
+        # Reflecting is costly, so it is done once per instance and only for
+        # the vocabulary tables, plus any other table passed to write_vocab,
+        # instead of the whole CDM.
+        if self._automap is None or (table is not None and table not in self._automap.metadata.tables):
+            wanted = {name for _, name in VOCAB_FILES}
+            if self._automap is not None:
+                wanted.update(self._automap.metadata.tables)
+            if table is not None:
+                wanted.add(table)
+            # a filter rather than a list, so tables missing from the
+            # database are skipped instead of failing the reflection
+            automap: AutomapBase = automap_base()
+            await conn.run_sync(lambda sync_conn: automap.prepare(
+                autoload_with=sync_conn,
+                reflection_options={'only': lambda name, _: name in wanted}))
+            self._automap = automap
+        return self._automap
+
+    async def _copy_records(self, conn, table, target, batches):
+        # One COPY FROM STDIN per table through asyncpg, on the session's own
+        # connection, is several times faster than INSERT on postgres. The
+        # adapter only sends BEGIN before a statement, so the copy opens its
+        # own transaction (a savepoint if one is already open) and a failed
+        # file leaves nothing behind.
+        batches = iter(batches)
+        first = next(batches, None)
+        if first is None:
+            return
+        records = itertools.chain.from_iterable(
+            batch.itertuples(index=False, name=None)
+            for batch in itertools.chain([first], batches))
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        async with driver.transaction():
+            await driver.copy_records_to_table(
+                table, records=records, columns=list(first.columns))
+
     async def write_vocab(self, df, table, if_exists='replace', chunk_size=1000):
+        self._concept_cache.clear()
         async with self.get_session() as session:
             conn = await session.connection()
-            automap: AutomapBase = automap_base()
-            await conn.run_sync(lambda sync_conn: automap.prepare(autoload_with=sync_conn))
-            mapper = getattr(automap.classes, table)
-            stmt = insert(mapper)
+            automap = await self._prepare_automap(conn, table)
+            target = getattr(automap.classes, table).__table__
+            # Core insert on the table skips the ORM bulk-insert plumbing
+            stmt = insert(target)
 
-            for _, group in df.groupby(np.arange(df.shape[0], dtype=int) // chunk_size):
-                await session.execute(stmt, group.to_dict("records"))
+            # df may be a single DataFrame or a chunked reader from read_vocab
+            frames = [df] if isinstance(df, pd.DataFrame) else df
+            if self._cdm.db == 'pgsql':
+                await self._copy_records(conn, table, target, _batches(frames, target, chunk_size))
+            else:
+                for batch in _batches(frames, target, chunk_size):
+                    await session.execute(stmt, batch.to_dict("records"))
             await session.commit()
             await session.close()
\ No newline at end of file
@@ -37,3 +37,60 @@ async def create_cohort(pyomop_fixture,engine):
     await session.close()
     await engine.dispose()
 
+
+
+def test_engine_is_shared(pyomop_fixture):
+    engine = pyomop_fixture.engine
+    assert pyomop_fixture.engine is engine
+    pyomop_fixture.name = 'cdm6.sqlite'
+    assert pyomop_fixture.engine is not engine
+    session = pyomop_fixture.session
+    assert pyomop_fixture.session is session
+    assert pyomop_fixture.async_session is session
+    pyomop_fixture.name = 'cdm6.sqlite'
+    assert pyomop_fixture.session is not session
+
+
+def test_prewarm(pyomop_fixture):
+    async def prewarm(connections):
+        await pyomop_fixture.prewarm(connections)
+        checked_in = pyomop_fixture.engine.pool.checkedin()
+        await pyomop_fixture.engine.dispose()
+        return checked_in
+
+    assert asyncio.run(prewarm(2)) == 2
+    # never more than the pool keeps
+    assert asyncio.run(prewarm(8)) == pyomop_fixture.engine.pool.size()
+
+
+def test_setter_disposes_engine(pyomop_fixture):
+    # session builds the engine itself, no need to read .engine first
+    assert pyomop_fixture.session is not None
+    asyncio.run(pyomop_fixture.prewarm(1))
+    engine = pyomop_fixture.engine
+    assert engine.pool.checkedin() == 1
+    pyomop_fixture.name = 'cdm6.sqlite'
+    assert engine.pool.checkedin() == 0
+
+
+def test_prewarm_failure_returns_connections(pyomop_fixture, monkeypatch):
+    engine = pyomop_fixture.engine
+    connect = type(engine).connect
+    calls = []
+
+    async def refused():
+        raise ConnectionError('refused')
+
+    def flaky_connect(self):
+        calls.append(None)
+        return refused() if len(calls) == 2 else connect(self)
+
+    async def prewarm():
+        with pytest.raises(ConnectionError):
+            await pyomop_fixture.prewarm(3)
+        checked_out = engine.pool.checkedout()
+        await engine.dispose()
+        return checked_out
+
+    monkeypatch.setattr(type(engine), 'connect', flaky_connect)
+    assert asyncio.run(prewarm()) == 0
@@ -42,3 +42,136 @@ def create_vocab(pyomop_fixture,engine):
 #     vocab = CdmVocabulary(pyomop_fixture)
 #     vocab.create_vocab('tests', 10)
 #     print("Done")
+
+def test_create_vocab_from_zip(metadata_fixture, tmp_path, capsys):
+    import glob
+    import os
+    import zipfile
+    from src.pyomop import CdmEngineFactory, CdmVocabulary
+    archive = tmp_path / 'vocabulary.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        for csv in glob.glob('tests/*.csv'):
+            z.write(csv, os.path.basename(csv))
+    cdm = CdmEngineFactory(name=str(tmp_path / 'cdm6.sqlite'))
+    asyncio.run(cdm.init_models(metadata_fixture))
+    vocab = CdmVocabulary(cdm)
+    vocab.create_vocab(str(archive), 10)
+    vocab.concept_id = 45956935
+    assert vocab.concept_name == 'xxxx xxxxxxx'
+
+def test_read_vocab(pyomop_fixture, capsys):
+    from src.pyomop import CdmVocabulary
+    vocab = CdmVocabulary(pyomop_fixture)
+    df = vocab.read_vocab('tests/CONCEPT.csv', 'concept')
+    assert df.shape == (4, 10)
+    assert df['concept_code'].tolist()[0] == '3578611000001105'
+
+def test_read_vocab_short_rows_keep_order(pyomop_fixture, tmp_path, capsys):
+    import pandas as pd
+    from src.pyomop import CdmVocabulary
+    path = tmp_path / 'CONCEPT.csv'
+    with open('tests/CONCEPT.csv') as f:
+        lines = [line for line in f.read().splitlines() if line]
+    # the sample rows lack the trailing tab of an empty invalid_reason;
+    # give it back to every other row so full and short rows are mixed
+    rows = [line + '\t' if i % 2 else line for i, line in enumerate(lines[1:])]
+    path.write_text('\n'.join([lines[0]] + rows) + '\n')
+    vocab = CdmVocabulary(pyomop_fixture)
+    df = pd.concat(list(vocab.read_vocab(str(path), 'concept', chunk_size=2)))
+    assert df['concept_id'].tolist() == [int(row.split('\t')[0]) for row in rows]
+
+def test_load_vocab_cancels_on_failure(pyomop_fixture, capsys):
+    from src.pyomop import CdmVocabulary
+    vocab = CdmVocabulary(pyomop_fixture)
+    # any backend but sqlite loads the tables concurrently; set after the
+    # engine is built so no server driver is needed
+    pyomop_fixture._db = 'pgsql'
+    cancelled = []
+
+    async def load_vocab_file(folder, filename, table, sample, chunk_size, archive=None):
+        if table == 'concept':
+            raise ValueError(filename)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.append(table)
+            raise
+
+    async def load_vocab_files():
+        with pytest.raises(ValueError):
+            await vocab._load_vocab_files('tests', None, 1000, None)
+        # the other tables are stopped before the error reaches the caller
+        return list(cancelled)
+
+    vocab._load_vocab_file = load_vocab_file
+    assert len(asyncio.run(load_vocab_files())) == 8
+
+def test_copy_records_once_per_table(pyomop_fixture, capsys):
+    from contextlib import asynccontextmanager
+    import pandas as pd
+    from src.pyomop import CdmVocabulary, metadata
+    from src.pyomop.vocabulary import _batches
+    calls = []
+
+    class Driver:
+        in_transaction = False
+
+        @asynccontextmanager
+        async def transaction(self):
+            self.in_transaction = True
+            yield
+            self.in_transaction = False
+
+        async def copy_records_to_table(self, table, records, columns):
+            calls.append((table, list(records), columns, self.in_transaction))
+
+    class Raw:
+        driver_connection = Driver()
+
+    class Conn:
+        async def get_raw_connection(self):
+            return Raw()
+
+    frames = [
+        pd.DataFrame({'domain_name': ['A', None], 'domain_id': ['a', 'b'],
+                      'domain_concept_id': [1, 2]}),
+        pd.DataFrame({'domain_name': ['C'], 'domain_id': ['c'], 'domain_concept_id': [3]}),
+    ]
+    target = metadata.tables['domain']
+    # the driver connection is mocked, so no postgres engine is needed
+    vocab = CdmVocabulary(pyomop_fixture)
+    asyncio.run(vocab._copy_records(Conn(), 'domain', target, _batches(frames, target, 1)))
+    assert calls == [('domain',
+                      [('a', 'A', 1), ('b', None, 2), ('c', 'C', 3)],
+                      ['domain_id', 'domain_name', 'domain_concept_id'],
+                      True)]
+
+def test_read_vocab_numeric_text_for_postgres(pyomop_fixture, tmp_path, capsys):
+    from src.pyomop import CdmVocabulary
+    path = tmp_path / 'DRUG_STRENGTH.csv'
+    with open('tests/DRUG_STRENGTH.csv') as f:
+        header, row = f.read().splitlines()[:2]
+    fields = row.split('\t')
+    fields[2] = '0.1'  # amount_value
+    path.write_text(header + '\n' + '\t'.join(fields) + '\n')
+    vocab = CdmVocabulary(pyomop_fixture)
+    assert vocab.read_vocab(str(path), 'drug_strength')['amount_value'][0] == 0.1
+    # asyncpg builds a Decimal from the value, so the literal is kept as text
+    pyomop_fixture._db = 'pgsql'
+    assert vocab.read_vocab(str(path), 'drug_strength')['amount_value'][0] == '0.1'
+
+def test_write_vocab_with_missing_vocab_tables(metadata_fixture, tmp_path, capsys):
+    from src.pyomop import CdmEngineFactory, CdmVocabulary
+    cdm = CdmEngineFactory(name=str(tmp_path / 'concept_only.sqlite'))
+
+    async def write_concept():
+        async with cdm.engine.begin() as conn:
+            await conn.run_sync(metadata_fixture.tables['concept'].create)
+        vocab = CdmVocabulary(cdm)
+        # the other vocabulary tables do not exist in this database
+        await vocab.write_vocab(vocab.read_vocab('tests/CONCEPT.csv', 'concept'), 'concept')
+        concept = await vocab.get_concept(45956935)
+        await cdm.engine.dispose()
+        return concept
+
+    assert asyncio.run(write_concept()).concept_name == 'xxxx xxxxxxx'
@@ -10,3 +10,43 @@ def test_vocab(pyomop_fixture, capsys):
     assert(vocab.concept_name == 'xxxx xxxxxxx')
 
 
+
+
+def test_concept_cache(pyomop_fixture, capsys):
+    import asyncio
+    from src.pyomop import CdmVocabulary
+    vocab = CdmVocabulary(pyomop_fixture)
+    first = asyncio.run(vocab.get_concept(45956935))
+    second = asyncio.run(vocab.get_concept(45956935))
+    assert first is second
+
+
+def test_set_concept_without_vocabulary(pyomop_fixture, capsys):
+    from src.pyomop import CdmVocabulary
+    vocab = CdmVocabulary(pyomop_fixture)
+    vocab.set_concept('3579011000001108')
+    assert vocab.concept_id == 45956935
+
+
+def test_get_concepts_by_code(pyomop_fixture, capsys):
+    import asyncio
+    from src.pyomop import CdmVocabulary
+    vocab = CdmVocabulary(pyomop_fixture)
+    concepts = asyncio.run(vocab.get_concepts_by_code(['3579011000001108', 'no-such-code']))
+    assert concepts['3579011000001108'].concept_id == 45956935
+    assert concepts['no-such-code'] is None
+
+
+def test_code_conditions_postgres(capsys):
+    from sqlalchemy import select
+    from sqlalchemy.dialects import postgresql
+    from src.pyomop.cdm6_tables import Concept
+    from src.pyomop.vocabulary import _code_conditions
+    codes = [str(code) for code in range(2500)]
+    # one array parameter on postgres, IN lists of 1000 elsewhere
+    assert len(_code_conditions(codes, 'sqlite')) == 3
+    conditions = _code_conditions(codes, 'pgsql')
+    assert len(conditions) == 1
+    compiled = select(Concept).where(conditions[0]).compile(dialect=postgresql.asyncpg.dialect())
+    assert 'concept.concept_code = ANY ($1::VARCHAR[])' in str(compiled)
+    assert compiled.params == {'codes': codes}